@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 Mathew Odden <mathewrodden@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time kfd.get_processes() serially and in parallel.
+
+By default a synthetic KFD process tree is generated in a temporary
+directory for each pid count. Files there are page cache backed, unlike
+sysfs attributes such as cu_occupancy which call into the driver, so
+use --live on a GPU node to measure the real tree.
+
+    python benchmarks/bench_processes.py --pids 100,1000,5000
+    python benchmarks/bench_processes.py --live
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+
+def make_tree(root, npids, ngpus=8):
+    kfd_proc = os.path.join(root, "kfd_proc")
+    proc = os.path.join(root, "proc")
+
+    for pid in range(1000, 1000 + npids):
+        os.makedirs(os.path.join(proc, str(pid)))
+        with open(os.path.join(proc, str(pid), "comm"), "w") as fd:
+            fd.write("worker-%d\n" % pid)
+
+        parent = os.path.join(kfd_proc, str(pid))
+        os.makedirs(parent)
+        with open(os.path.join(parent, "pasid"), "w") as fd:
+            fd.write("%d\n" % pid)
+
+        gpu_id = 40000 + pid % ngpus
+        for typ in ("vram", "sdma"):
+            with open(os.path.join(parent, "%s_%d" % (typ, gpu_id)), "w") as fd:
+                fd.write("4096\n")
+
+        os.makedirs(os.path.join(parent, "stats_%d" % gpu_id))
+        with open(os.path.join(parent, "stats_%d" % gpu_id, "cu_occupancy"), "w") as fd:
+            fd.write("10\n")
+
+        queue = os.path.join(parent, "queues", "0")
+        os.makedirs(queue)
+        with open(os.path.join(queue, "gpuid"), "w") as fd:
+            fd.write("%d\n" % gpu_id)
+
+    return kfd_proc, proc
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench(kfd, label, workers_list, repeat):
+    base = None
+    for workers in workers_list:
+        t = best_of(lambda: kfd.get_processes(workers=workers), repeat)
+        base = base or t
+        print(
+            "%-12s workers=%-3d %9.2f ms  speedup %.2fx"
+            % (label, workers, t * 1000, base / t)
+        )
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--pids", default="100,1000,5000")
+    p.add_argument(
+        "--workers", default=None, help="comma separated, default 1,2,4..ncpu"
+    )
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--live", action="store_true", help="measure this node's KFD tree")
+    args = p.parse_args()
+
+    if args.workers:
+        workers_list = [int(w) for w in args.workers.split(",")]
+    else:
+        ncpu = os.cpu_count() or 1
+        workers_list = [1]
+        while workers_list[-1] * 2 <= max(ncpu, 8):
+            workers_list.append(workers_list[-1] * 2)
+
+    print("cpus: %d" % (os.cpu_count() or 1))
+
+    if args.live:
+        from rocmi import kfd
+
+        bench(kfd, "live", workers_list, args.repeat)
+        return
+
+    # import with an empty topology so this runs on machines without a GPU
+    with mock.patch("os.listdir", return_value=[]):
+        from rocmi import kfd
+
+    for npids in [int(n) for n in args.pids.split(",")]:
+        root = tempfile.mkdtemp(prefix="rocmi-bench-")
+        try:
+            kfd_proc, proc = make_tree(root, npids)
+            with mock.patch.object(kfd, "KFD_PROC", kfd_proc), mock.patch.object(
+                kfd, "PROC", proc
+            ):
+                bench(kfd, "pids=%d" % npids, workers_list, args.repeat)
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,7 +23,9 @@ import sys
 import re
 import struct
 
+from rocmi import topology
 from rocmi.kfd import get_processes
+from rocmi.snapshots import snapshot
 
 
 LOG = logging.getLogger(__name__)
@@ -139,6 +141,34 @@ class Metrics_1_3(ctypes.Structure):
     ]
 
 
+def metrics_class(dat):
+    """Return the Metrics structure matching the header of a gpu_metrics table."""
+    mh = MetricsHeader.from_buffer_copy(dat[:4])
+    if mh.content_revision == 3:
+        return Metrics_1_3
+    elif mh.content_revision == 5:
+        return Metrics_1_5
+    else:
+        raise NotImplementedError
+
+
+def decode_metrics(dat):
+    return metrics_class(dat).from_buffer_copy(dat)
+
+
+def metrics_timestamps(dat):
+    """Return (firmware_timestamp, system_clock_counter) of a raw gpu_metrics table.
+
+    Only the two counters are unpacked, which makes this a cheap way to tell
+    whether firmware has refreshed the table since a previous read.
+    """
+    cls = metrics_class(dat)
+    return (
+        struct.unpack_from("=Q", dat, cls.firmware_timestamp.offset)[0],
+        struct.unpack_from("=Q", dat, cls.system_clock_counter.offset)[0],
+    )
+
+
 def print_struct(s):
     for f, t in s._fields_:
         print("%s=%r" % (f, getattr(s, f)))
@@ -159,7 +189,8 @@ def _iter_drm_devices():
     for card in cards:
         path = "/sys/class/drm/%s/device/vendor" % card
         try:
-            vend = open(path, "rb").read().strip()
+            with open(path, "rb") as fd:
+                vend = fd.read().strip()
             vend = int(vend, 16)
         except Exception:
             LOG.debug("error reading vendor from %s" % path)
@@ -295,17 +326,13 @@ class DeviceInfo(MemoryDescriptorMixin, PowerDescriptorMixin):
 
         return dat
 
-    def get_metrics(self):
+    def read_metrics_raw(self):
+        """Return the undecoded contents of the gpu_metrics table."""
         with open(os.path.join(self.path, "gpu_metrics"), "rb") as fd:
-            dat = fd.read()
+            return fd.read()
 
-        mh = MetricsHeader.from_buffer_copy(dat[:4])
-        if mh.content_revision == 3:
-            return Metrics_1_3.from_buffer_copy(dat)
-        elif mh.content_revision == 5:
-            return Metrics_1_5.from_buffer_copy(dat)
-        else:
-            raise NotImplementedError
+    def get_metrics(self):
+        return decode_metrics(self.read_metrics_raw())
 
     def drm_file_info(self, file_name):
         with open(os.path.join(self.path, file_name)) as fd:
@@ -316,12 +343,14 @@ class DeviceInfo(MemoryDescriptorMixin, PowerDescriptorMixin):
 
     def get_processes(self):
         """Return a list of ComputeProcess that have allocations on this device."""
-        node = kfd.unique_to_kfd.get(self.unique_id)
-        if not node:
+        topo = topology.get_topology()
+        node = topo.node_for_unique_id(self.unique_id)
+        if node is None:
             raise Exception("No KFD device found matching %r")
 
+        gpu_id = topo.nodes[node].gpu_id
         ps = get_processes()
-        return list(filter(lambda x: node.gpu_id in x.gpus, ps))
+        return list(filter(lambda x: gpu_id in x.gpus, ps))
 
 
 def get_devices():
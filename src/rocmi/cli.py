@@ -15,90 +15,293 @@
 # limitations under the License.
 
 import argparse
+import csv
+import json
 import logging
-
-from prettytable import PrettyTable, PLAIN_COLUMNS
+import sys
+import time
 
 import rocmi
+from rocmi import instrument, kfd, topology
+
+
+LOG = logging.getLogger(__name__)
+
+
+OUTPUTS = ["table", "json", "ndjson", "csv"]
+
+DEVICE_FIELDS = ["index", "id", "serial", "name", "drm_path", "bus_id", "processes"]
+PROCESS_FIELDS = [
+    "pid",
+    "pasid",
+    "name",
+    "vram",
+    "sdma_usage",
+    "cu_occupancy",
+    "gpus",
+]
+
+
+class _Row:
+    def values(self, fields):
+        return [getattr(self, "field_" + f)() for f in fields]
+
+
+class _DeviceRow(_Row):
+    """Lazily evaluated columns for one device.
+
+    Each column is only read from sysfs when its field is requested.
+    """
+
+    def __init__(self, index, card, procs):
+        self.index = index
+        self.card = card
+        self.procs = procs
+
+    def field_index(self):
+        return self.index
+
+    def field_id(self):
+        return self.card.unique_id
+
+    def field_serial(self):
+        return self.card.serial
+
+    def field_name(self):
+        return self.card.name
+
+    def field_drm_path(self):
+        return self.card.path
+
+    def field_bus_id(self):
+        return self.card.bus_id
+
+    def field_processes(self):
+        topo = topology.get_topology()
+        node = topo.node_for_unique_id(self.card.unique_id)
+        if node is None:
+            return []
+
+        gpu_id = topo.nodes[node].gpu_id
+        return [
+            "%s(%d)" % (name, pid)
+            for pid, (name, gpus) in self.procs.items()
+            if gpu_id in gpus
+        ]
+
+
+class _ProcessRow(_Row):
+    """Lazily evaluated columns for one KFD process."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self._usages = None
+
+    def usages(self):
+        if self._usages is None:
+            self._usages = kfd._read_kfd_usages(self.pid)
+
+        return self._usages
+
+    def values(self, fields):
+        try:
+            return super().values(fields)
+        except kfd._EXITED:
+            LOG.debug("process %d exited during scan", self.pid)
+            return None
+
+    def field_pid(self):
+        return self.pid
+
+    def field_pasid(self):
+        return kfd.read_process_pasid(self.pid)
+
+    def field_name(self):
+        return kfd.read_process_name(self.pid)
+
+    def field_vram(self):
+        return self.usages()[0]
+
+    def field_sdma_usage(self):
+        return self.usages()[1]
+
+    def field_cu_occupancy(self):
+        return self.usages()[2]
+
+    def field_gpus(self):
+        return kfd._gpu_ids_for_pid(self.pid) or None
+
+
+class _ProcessMap:
+    """Map of pid to (name, gpu_ids), scanned once on first access."""
+
+    def __init__(self):
+        self._procs = None
+
+    def items(self):
+        if self._procs is None:
+            self._procs = {}
+            for pid in kfd.iter_pids():
+                try:
+                    name = kfd.read_process_name(pid)
+                    gpus = kfd._gpu_ids_for_pid(pid)
+                except kfd._EXITED:
+                    LOG.debug("process %d exited during scan", pid)
+                    continue
+
+                self._procs[pid] = (name, gpus)
+
+        return self._procs.items()
+
+
+def iter_device_rows():
+    # shared between rows so the process table is walked at most once
+    procs = _ProcessMap()
+    for i, card in enumerate(rocmi.get_devices()):
+        yield _DeviceRow(i, card, procs)
+
+
+def iter_process_rows():
+    for pid in kfd.iter_pids():
+        yield _ProcessRow(pid)
+
+
+def _plain(val):
+    if isinstance(val, (set, frozenset)):
+        return sorted(val)
+
+    return val
+
+
+def write_table(fields, rows, style=None, out=None):
+    from prettytable import PrettyTable, PLAIN_COLUMNS
+
+    tab = PrettyTable()
+    tab.align = "l"
+    if style == "COLUMN":
+        tab.set_style(PLAIN_COLUMNS)
+
+    tab.field_names = [f.upper() for f in fields]
+    for row in rows:
+        tab.add_row(row)
+
+    print(tab, file=out or sys.stdout)
+
+
+def write_json(fields, rows, out=None):
+    out = out or sys.stdout
+    out.write("[")
+    sep = "\n"
+    for row in rows:
+        out.write(sep)
+        out.write(json.dumps(dict(zip(fields, map(_plain, row)))))
+        sep = ",\n"
+    out.write("\n]\n")
+
+
+def write_ndjson(fields, rows, out=None):
+    out = out or sys.stdout
+    for row in rows:
+        out.write(json.dumps(dict(zip(fields, map(_plain, row)))))
+        out.write("\n")
+        out.flush()
+
+
+def write_csv(fields, rows, out=None):
+    out = out or sys.stdout
+    w = csv.writer(out)
+    w.writerow(fields)
+    for row in rows:
+        vals = []
+        for val in map(_plain, row):
+            if isinstance(val, list):
+                val = " ".join(map(str, val))
+            vals.append(val)
+        w.writerow(vals)
+
+
+def emit(args, fields, objs):
+    # rows come back as None for processes that exited mid-scan
+    rows = (r for r in (o.values(fields) for o in objs) if r is not None)
+
+    if args.output == "table":
+        write_table(fields, rows, style=getattr(args, "format", None))
+    elif args.output == "json":
+        write_json(fields, rows)
+    elif args.output == "ndjson":
+        write_ndjson(fields, rows)
+    elif args.output == "csv":
+        write_csv(fields, rows)
+
+
+def _fields_type(choices):
+    def parse(val):
+        fields = [f.strip().lower() for f in val.split(",") if f.strip()]
+        for f in fields:
+            if f not in choices:
+                raise argparse.ArgumentTypeError(
+                    "unknown field %r, choose from %s" % (f, ",".join(choices))
+                )
+
+        return fields
+
+    return parse
 
 
 def parse_args():
     p = argparse.ArgumentParser()
+    p.add_argument(
+        "--profile",
+        action="store_true",
+        help="print counts and latencies of the sysfs I/O done to stderr",
+    )
     subps = p.add_subparsers(dest="action", required=True)
 
     ld = subps.add_parser("list-devices")
     ld.add_argument("--format", choices=["TABLE", "COLUMN"], default="TABLE")
+    ld.add_argument("--output", choices=OUTPUTS, default="table")
+    ld.add_argument(
+        "--fields",
+        type=_fields_type(DEVICE_FIELDS),
+        default=DEVICE_FIELDS,
+        help="comma separated list of: %s" % ",".join(DEVICE_FIELDS),
+    )
 
     ps = subps.add_parser("list-processes")
+    ps.add_argument("--output", choices=OUTPUTS, default="table")
+    ps.add_argument(
+        "--fields",
+        type=_fields_type(PROCESS_FIELDS),
+        default=PROCESS_FIELDS,
+        help="comma separated list of: %s" % ",".join(PROCESS_FIELDS),
+    )
 
     return p.parse_args()
 
 
+def run(args):
+    if args.action == "list-devices":
+        emit(args, args.fields, iter_device_rows())
+
+    elif args.action == "list-processes":
+        emit(args, args.fields, iter_process_rows())
+
+
 def main():
     args = parse_args()
 
-    if args.action == "list-devices":
+    if not args.profile:
+        run(args)
+        return
 
-        tab = PrettyTable()
-        tab.align = "l"
-        if args.format == "COLUMN":
-            tab.set_style(PLAIN_COLUMNS)
-
-        tab.field_names = [
-            "INDEX",
-            "ID",
-            "SERIAL",
-            "NAME",
-            "DRM_PATH",
-            "BUS_ID",
-            "PROCESSES",
-        ]
-        for i, card in enumerate(rocmi.get_devices()):
-            processes = list(
-                map(lambda x: "%s(%d)" % (x.name, x.pid), card.get_processes())
-            )
-            tab.add_row(
-                [
-                    i,
-                    card.unique_id,
-                    card.serial,
-                    card.name,
-                    card.path,
-                    card.bus_id,
-                    processes,
-                ]
-            )
-
-        print(tab)
-
-    elif args.action == "list-processes":
-        tab = PrettyTable()
-        tab.align = "l"
-
-        tab.field_names = [
-            "PID",
-            "PASID",
-            "NAME",
-            "VRAM",
-            "SDMA_USAGE",
-            "CU_OCCUPANCY",
-            "GPUS",
-        ]
-        ps = rocmi.get_processes()
-        for p in ps:
-            tab.add_row(
-                [
-                    p.pid,
-                    p.pasid,
-                    p.name,
-                    p.vram_usage,
-                    p.sdma_usage,
-                    p.cu_occupancy,
-                    p.gpus or None,
-                ]
-            )
-
-        print(tab)
+    start = time.perf_counter()
+    with instrument.profiling():
+        try:
+            run(args)
+        finally:
+            elapsed = time.perf_counter() - start
+            print(instrument.report(), file=sys.stderr)
+            print("elapsed: %.3f ms" % (elapsed * 1000), file=sys.stderr)
 
 
 if __name__ == "__main__":
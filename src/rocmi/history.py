@@ -0,0 +1,318 @@
+# Copyright 2024 Mathew Odden <mathewrodden@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import math
+from array import array
+from collections import namedtuple
+
+
+LOG = logging.getLogger(__name__)
+
+NAN = float("nan")
+
+
+Tier = namedtuple(
+    "Tier",
+    [
+        "resolution",  # seconds covered by one point
+        "capacity",  # number of points retained
+    ],
+)
+
+Point = namedtuple("Point", ["timestamp", "min", "max", "mean", "last"])
+
+QueryResult = namedtuple(
+    "QueryResult",
+    [
+        "resolution",  # seconds per point, None for raw samples
+        "points",  # list of Point, oldest first
+    ],
+)
+
+
+# 10 minutes of raw samples at 1 Hz
+DEFAULT_RAW_CAPACITY = 600
+
+DEFAULT_TIERS = (
+    Tier(10, 6 * 360),  # 6 hours
+    Tier(60, 3 * 1440),  # 3 days
+    Tier(600, 28 * 144),  # 4 weeks
+)
+
+DEFAULT_FIELDS = (
+    "temperature_hotspot",
+    "temperature_mem",
+    "average_gfx_activity",
+    "average_umc_activity",
+    "throttle_status",
+    "current_uclk",
+    "pcie_link_width",
+    "pcie_link_speed",
+)
+
+# min, max, mean and last are stored per field in a rolled up tier
+_AGGS = 4
+
+
+class _Ring:
+    """Fixed size ring of timestamped rows of `width` doubles."""
+
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self.width = width
+        self.ts = array("d", bytes(8 * capacity))
+        self.vals = array("d", bytes(8 * capacity * width))
+        self.head = 0  # physical index of the oldest row
+        self.count = 0
+
+    @property
+    def nbytes(self):
+        return (len(self.ts) + len(self.vals)) * self.ts.itemsize
+
+    def append(self, ts, row):
+        if self.count < self.capacity:
+            idx = (self.head + self.count) % self.capacity
+            self.count += 1
+        else:
+            idx = self.head
+            self.head = (self.head + 1) % self.capacity
+
+        self.ts[idx] = ts
+        off = idx * self.width
+        self.vals[off : off + self.width] = array("d", row)
+
+    def _phys(self, i):
+        return (self.head + i) % self.capacity
+
+    def covers(self, t):
+        """Return True if no row with timestamp >= t has been overwritten."""
+        return self.count < self.capacity or self.ts[self.head] <= t
+
+    def bisect(self, t):
+        """Return logical index of the first row with timestamp >= t."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._phys(mid)] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def column(self, col, start, end):
+        """Yield (timestamp, value) of column `col` for start <= timestamp < end."""
+        for i in range(self.bisect(start), self.bisect(end)):
+            idx = self._phys(i)
+            yield self.ts[idx], self.vals[idx * self.width + col]
+
+
+class _Rollup:
+    """A downsampled tier plus the bucket it is currently accumulating."""
+
+    def __init__(self, tier, nfields):
+        self.resolution = tier.resolution
+        self.ring = _Ring(tier.capacity, nfields * _AGGS)
+        self.nfields = nfields
+        self.bucket = None
+        self._reset()
+
+    def _reset(self):
+        n = self.nfields
+        self.mins = [math.inf] * n
+        self.maxs = [-math.inf] * n
+        self.sums = [0.0] * n
+        self.counts = [0] * n
+        self.lasts = [NAN] * n
+
+    def _aggregates(self):
+        row = []
+        for i in range(self.nfields):
+            if self.counts[i]:
+                row += [
+                    self.mins[i],
+                    self.maxs[i],
+                    self.sums[i] / self.counts[i],
+                    self.lasts[i],
+                ]
+            else:
+                row += [NAN] * _AGGS
+        return row
+
+    def add(self, ts, vals):
+        bucket = ts - ts % self.resolution
+
+        if bucket != self.bucket:
+            if self.bucket is not None:
+                self.ring.append(self.bucket, self._aggregates())
+                self._reset()
+            self.bucket = bucket
+
+        for i, v in enumerate(vals):
+            if v != v:  # NaN, field missing from this sample
+                continue
+            if v < self.mins[i]:
+                self.mins[i] = v
+            if v > self.maxs[i]:
+                self.maxs[i] = v
+            self.sums[i] += v
+            self.counts[i] += 1
+            self.lasts[i] = v
+
+    def points(self, col, start, end):
+        base = col * _AGGS
+        ring = self.ring
+        for i in range(ring.bisect(start), ring.bisect(end)):
+            idx = ring._phys(i)
+            off = idx * ring.width + base
+            yield Point(ring.ts[idx], *ring.vals[off : off + _AGGS])
+
+        # include the bucket still being filled so recent queries aren't stale
+        if self.bucket is not None and start <= self.bucket < end:
+            row = self._aggregates()
+            yield Point(self.bucket, *row[base : base + _AGGS])
+
+
+class _Series:
+    def __init__(self, raw_capacity, tiers, nfields):
+        self.raw = _Ring(raw_capacity, nfields)
+        self.rollups = [_Rollup(t, nfields) for t in tiers]
+        self.last_ts = None
+
+    @property
+    def nbytes(self):
+        return self.raw.nbytes + sum(r.ring.nbytes for r in self.rollups)
+
+
+def _extract(metrics, field):
+    if isinstance(metrics, dict):
+        v = metrics.get(field)
+    else:
+        v = getattr(metrics, field, None)
+
+    if v is None:
+        return NAN
+
+    if not isinstance(v, (int, float)):
+        # per instance arrays such as temperature_hbm, keep the worst one
+        v = max(v)
+
+    return float(v)
+
+
+class HistoryStore:
+    """Bounded memory history of metric samples, per device.
+
+    The newest `raw_capacity` samples are kept as is. Every sample is also
+    rolled up into each of `tiers`, which keep min/max/mean/last of every
+    field per `resolution` seconds for the last `capacity` points. All
+    storage is preallocated in flat arrays when a device is first seen, so
+    memory use is fixed and given by bytes_per_key().
+    """
+
+    def __init__(
+        self,
+        fields=DEFAULT_FIELDS,
+        tiers=DEFAULT_TIERS,
+        raw_capacity=DEFAULT_RAW_CAPACITY,
+    ):
+        self.fields = tuple(fields)
+        self.tiers = tuple(sorted(tiers, key=lambda t: t.resolution))
+        self.raw_capacity = raw_capacity
+        self._columns = {f: i for i, f in enumerate(self.fields)}
+        self._series = {}
+
+    def bytes_per_key(self):
+        """Return the bytes of sample storage allocated for each device."""
+        n = len(self.fields)
+        rows = (self.raw_capacity, n + 1)
+        tier_rows = [(t.capacity, n * _AGGS + 1) for t in self.tiers]
+        return 8 * sum(cap * width for cap, width in [rows] + tier_rows)
+
+    @property
+    def nbytes(self):
+        return sum(s.nbytes for s in self._series.values())
+
+    def keys(self):
+        return list(self._series)
+
+    def add(self, key, timestamp, metrics):
+        """Record a sample for device `key`.
+
+        `metrics` is a structure from DeviceInfo.get_metrics() or a dict;
+        fields it doesn't have are stored as missing. Samples older than the
+        newest one already recorded for `key` are dropped.
+        """
+
+        series = self._series.get(key)
+        if series is None:
+            series = _Series(self.raw_capacity, self.tiers, len(self.fields))
+            self._series[key] = series
+
+        if series.last_ts is not None and timestamp < series.last_ts:
+            LOG.debug("dropping out of order sample for %r at %r", key, timestamp)
+            return
+
+        series.last_ts = timestamp
+
+        vals = [_extract(metrics, f) for f in self.fields]
+        series.raw.append(timestamp, vals)
+        for r in series.rollups:
+            r.add(timestamp, vals)
+
+    def add_snapshot(self, snap):
+        """Record every device of a NodeSnapshot, keyed by bus_id."""
+        for dev in snap.devices:
+            m = dev.metrics()
+            if m is not None:
+                self.add(dev.bus_id, snap.timestamp, m)
+
+    def query(self, key, field, start, end, max_points=None):
+        """Return a QueryResult of `field` for start <= timestamp < end.
+
+        The finest resolution that has not dropped any data since `start` is used,
+        coarsened further if that would return more than `max_points`.
+        """
+
+        series = self._series.get(key)
+        if series is None:
+            return QueryResult(None, [])
+
+        col = self._columns[field]
+        raw = series.raw
+
+        if raw.covers(start):
+            n = raw.bisect(end) - raw.bisect(start)
+            if max_points is None or n <= max_points:
+                return self._raw_result(raw, col, start, end)
+
+        chosen = None
+        for r in series.rollups:
+            chosen = r
+            if max_points is not None and (end - start) / r.resolution > max_points:
+                continue
+
+            if r.ring.covers(start):
+                break
+
+        if chosen is None:
+            # no tiers configured, raw samples are all there is
+            return self._raw_result(raw, col, start, end)
+
+        return QueryResult(chosen.resolution, list(chosen.points(col, start, end)))
+
+    @staticmethod
+    def _raw_result(raw, col, start, end):
+        points = [Point(t, v, v, v, v) for t, v in raw.column(col, start, end)]
+        return QueryResult(None, points)
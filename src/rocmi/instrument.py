@@ -0,0 +1,347 @@
+# Copyright 2024 Mathew Odden <mathewrodden@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Opt-in counters for the sysfs and procfs I/O done by rocmi.
+
+When enabled, the `open` and `os` names of rocmi's reader modules are
+shadowed with counting wrappers, so every open, read, byte and directory
+listing is attributed to a path class along with a latency histogram.
+When disabled the shadowing names are removed again and the readers run
+exactly as without instrumentation.
+"""
+
+import builtins
+import os
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+
+
+# modules whose file access is instrumented
+MODULES = ("rocmi", "rocmi.kfd", "rocmi.topology")
+
+# latency histogram buckets, upper bounds in microseconds
+BUCKETS_US = tuple(2**i for i in range(4, 22))
+
+_CLASSES = [
+    ("gpu_metrics", re.compile(r"/gpu_metrics$")),
+    ("kfd_proc", re.compile(r"^/sys/class/kfd/kfd/proc(/|$)")),
+    ("kfd_topology", re.compile(r"^/sys/class/kfd/kfd/topology(/|$)")),
+    ("proc_comm", re.compile(r"^/proc/\d+/comm$")),
+    ("proc_fdinfo", re.compile(r"^/proc/\d+/fdinfo(/|$)")),
+    ("pci_ids", re.compile(r"/pci\.ids$")),
+    ("hwmon", re.compile(r"/hwmon(/|$)")),
+    ("drm", re.compile(r"^/sys/class/drm(/|$)")),
+    ("module", re.compile(r"^/sys/module/")),
+]
+
+
+IOStats = namedtuple(
+    "IOStats",
+    [
+        "opens",
+        "reads",  # read calls, including readline(s) and line iteration
+        "bytes",  # characters for files opened in text mode
+        "listdirs",  # directories listed, including each os.walk step
+        "errors",  # opens that raised
+        "seconds",  # total time from open to close, plus listing time
+        "histogram",  # open to close and listing latencies, counts per BUCKETS_US
+    ],
+)
+
+
+def classify(path):
+    """Return the attribute class for a filesystem path."""
+    path = os.fspath(path)
+    for name, pat in _CLASSES:
+        if pat.search(path):
+            return name
+
+    return "other"
+
+
+class _Counter:
+    __slots__ = (
+        "opens",
+        "reads",
+        "bytes",
+        "listdirs",
+        "errors",
+        "seconds",
+        "histogram",
+    )
+
+    def __init__(self):
+        self.opens = 0
+        self.reads = 0
+        self.bytes = 0
+        self.listdirs = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.histogram = [0] * (len(BUCKETS_US) + 1)
+
+    def freeze(self):
+        return IOStats(
+            self.opens,
+            self.reads,
+            self.bytes,
+            self.listdirs,
+            self.errors,
+            self.seconds,
+            tuple(self.histogram),
+        )
+
+
+_lock = threading.Lock()
+_counters = {}
+_depth = 0  # enable() calls not yet matched by disable()
+
+
+def _counter(cls):
+    c = _counters.get(cls)
+    if c is None:
+        c = _counters.setdefault(cls, _Counter())
+    return c
+
+
+def _record_latency(c, seconds):
+    us = seconds * 1e6
+    i = 0
+    while i < len(BUCKETS_US) and us > BUCKETS_US[i]:
+        i += 1
+
+    with _lock:
+        c.seconds += seconds
+        c.histogram[i] += 1
+
+
+def _record_read(c, data):
+    with _lock:
+        c.reads += 1
+        c.bytes += len(data)
+
+
+class _ProfiledFile:
+    def __init__(self, fd, counter, start):
+        self._fd = fd
+        self._counter = counter
+        self._start = start
+        self._closed = False
+
+    def read(self, *args):
+        data = self._fd.read(*args)
+        _record_read(self._counter, data)
+        return data
+
+    def readline(self, *args):
+        data = self._fd.readline(*args)
+        _record_read(self._counter, data)
+        return data
+
+    def readlines(self, *args):
+        lines = self._fd.readlines(*args)
+        for line in lines:
+            _record_read(self._counter, line)
+        return lines
+
+    def __iter__(self):
+        for line in self._fd:
+            _record_read(self._counter, line)
+            yield line
+
+    def close(self):
+        self._fd.close()
+        if not self._closed:
+            self._closed = True
+            _record_latency(self._counter, time.perf_counter() - self._start)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._fd, name)
+
+
+def _profiled_open(file, *args, **kwargs):
+    c = _counter(classify(file))
+    start = time.perf_counter()
+
+    try:
+        fd = builtins.open(file, *args, **kwargs)
+    except OSError:
+        with _lock:
+            c.opens += 1
+            c.errors += 1
+        _record_latency(c, time.perf_counter() - start)
+        raise
+
+    with _lock:
+        c.opens += 1
+
+    return _ProfiledFile(fd, c, start)
+
+
+class _ProfiledOS:
+    """Stand in for the os module that counts and times directory listings."""
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+    def listdir(self, path="."):
+        c = _counter(classify(path))
+        with _lock:
+            c.listdirs += 1
+
+        start = time.perf_counter()
+        try:
+            return os.listdir(path)
+        finally:
+            _record_latency(c, time.perf_counter() - start)
+
+    def walk(self, top, *args, **kwargs):
+        c = _counter(classify(top))
+        steps = os.walk(top, *args, **kwargs)
+        while True:
+            start = time.perf_counter()
+            try:
+                step = next(steps)
+            except StopIteration:
+                return
+
+            with _lock:
+                c.listdirs += 1
+            _record_latency(c, time.perf_counter() - start)
+            yield step
+
+
+_profiled_os = _ProfiledOS()
+
+
+def enable():
+    """Start counting I/O done by rocmi.
+
+    Calls nest, counting stops once each has been matched by disable().
+    """
+    global _depth
+
+    with _lock:
+        _depth += 1
+        if _depth > 1:
+            return
+
+        for name in MODULES:
+            mod = sys.modules.get(name)
+            if mod is not None:
+                mod.open = _profiled_open
+                mod.os = _profiled_os
+
+
+def disable():
+    """Stop counting, leaving collected stats in place."""
+    global _depth
+
+    with _lock:
+        if not _depth:
+            return
+
+        _depth -= 1
+        if _depth:
+            return
+
+        for name in MODULES:
+            mod = sys.modules.get(name)
+            if mod is not None:
+                mod.__dict__.pop("open", None)
+                mod.os = os
+
+
+def is_enabled():
+    return _depth > 0
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+
+
+def stats():
+    """Return a dict of attribute class to IOStats."""
+    with _lock:
+        return {k: c.freeze() for k, c in sorted(_counters.items())}
+
+
+class profiling:
+    """Context manager enabling instrumentation for the duration of a block."""
+
+    def __enter__(self):
+        enable()
+        return self
+
+    def __exit__(self, *exc):
+        disable()
+
+
+def percentile(histogram, pct):
+    """Return the bucket upper bound in microseconds holding the `pct` percentile."""
+    total = sum(histogram)
+    if not total:
+        return None
+
+    target = total * pct / 100.0
+    seen = 0
+    for i, n in enumerate(histogram):
+        seen += n
+        if seen >= target:
+            return BUCKETS_US[i] if i < len(BUCKETS_US) else float("inf")
+
+
+def report(st=None):
+    """Return a plain text table of `st`, or the current stats."""
+    if st is None:
+        st = stats()
+
+    header = "%-14s %8s %8s %10s %8s %6s %10s %9s %9s" % (
+        "CLASS",
+        "OPENS",
+        "READS",
+        "BYTES",
+        "LISTDIRS",
+        "ERRORS",
+        "TOTAL_MS",
+        "P50_US",
+        "P99_US",
+    )
+    lines = [header]
+    for cls, s in st.items():
+        lines.append(
+            "%-14s %8d %8d %10d %8d %6d %10.3f %9s %9s"
+            % (
+                cls,
+                s.opens,
+                s.reads,
+                s.bytes,
+                s.listdirs,
+                s.errors,
+                s.seconds * 1000,
+                "<=%s" % percentile(s.histogram, 50) if sum(s.histogram) else "-",
+                "<=%s" % percentile(s.histogram, 99) if sum(s.histogram) else "-",
+            )
+        )
+
+    return "\n".join(lines)
@@ -16,6 +16,7 @@ import binascii
 import logging
 import os
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 
 LOG = logging.getLogger(__name__)
@@ -36,41 +37,86 @@ ComputeProcess = namedtuple(
 )
 
 
-def get_processes():
-    parent = "/sys/class/kfd/kfd/proc"
-    procs = []
-    for proc_dir in os.listdir(parent):
+KFD_PROC = "/sys/class/kfd/kfd/proc"
+PROC = "/proc"
 
+# raised when reading a process that exited while we were scanning it
+_EXITED = (FileNotFoundError, ProcessLookupError)
+
+
+def iter_pids():
+    """Yield PIDs of processes that have opened the KFD device, in order."""
+
+    pids = []
+    for proc_dir in os.listdir(KFD_PROC):
         try:
-            pid = int(proc_dir)
+            pids.append(int(proc_dir))
         except ValueError:
             continue
 
-        with open(os.path.join(parent, proc_dir, "pasid")) as fd:
-            pasid = int(fd.read().strip())
+    return iter(sorted(pids))
+
+
+def read_process_pasid(pid):
+    return _read_int(os.path.join(KFD_PROC, str(pid), "pasid"))
+
 
+def read_process(pid):
+    """Return a ComputeProcess for `pid`, or None if it has exited."""
+
+    try:
+        pasid = read_process_pasid(pid)
         vram_usage, sdma_usage, cu_occupancy, gpu_infos = _read_kfd_usages(pid)
         gpus = _gpu_ids_for_pid(pid)
+        name = read_process_name(pid)
+    except _EXITED:
+        LOG.debug("process %d exited during scan", pid)
+        return None
+
+    return ComputeProcess(
+        pid=pid,
+        pasid=pasid,
+        name=name,
+        vram_usage=vram_usage,
+        sdma_usage=sdma_usage,
+        cu_occupancy=cu_occupancy,
+        gpus=gpus,
+        gpu_usage_info=gpu_infos,
+    )
+
+
+def _map_pids(func, pids, workers):
+    """Return {pid: func(pid)}, sharding pids over up to `workers` threads."""
+
+    pids = list(pids)
+    workers = min(workers or 1, len(pids))
 
-        p = ComputeProcess(
-            pid=pid,
-            pasid=pasid,
-            name=read_process_name(pid),
-            vram_usage=vram_usage,
-            sdma_usage=sdma_usage,
-            cu_occupancy=cu_occupancy,
-            gpus=gpus,
-            gpu_usage_info=gpu_infos,
-        )
-        procs.append(p)
+    if workers <= 1:
+        return {pid: func(pid) for pid in pids}
 
-    return procs
+    def run_shard(shard):
+        return [(pid, func(pid)) for pid in shard]
+
+    shards = [pids[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return {pid: res for part in ex.map(run_shard, shards) for pid, res in part}
+
+
+def get_processes(workers=None):
+    """Return a list of ComputeProcess ordered by pid.
+
+    With `workers` > 1 the per process sysfs reads are sharded over a pool
+    of that many threads. Processes that exit mid-scan are left out.
+    """
+
+    procs = _map_pids(read_process, iter_pids(), workers)
+    return [procs[pid] for pid in sorted(procs) if procs[pid] is not None]
 
 
 def read_process_name(pid):
     """Return command name associated with PID."""
 
-    with open("/proc/%d/comm" % pid, "r") as fd:
+    with open(os.path.join(PROC, str(pid), "comm"), "r") as fd:
         return fd.read().strip()
 
 
@@ -79,7 +125,7 @@ def _gpu_ids_for_pid(pid):
 
 
 def _read_queues_for_pid(pid):
-    parent = "/sys/class/kfd/kfd/proc/%d/queues" % pid
+    parent = os.path.join(KFD_PROC, str(pid), "queues")
     queues = []
 
     for queue_dir in os.listdir(parent):
@@ -94,7 +140,7 @@ def _read_queues_for_pid(pid):
 
 
 def _read_kfd_usages(pid):
-    parent = "/sys/class/kfd/kfd/proc/%d" % pid
+    parent = os.path.join(KFD_PROC, str(pid))
 
     # totals
     vram_usage = 0
@@ -162,14 +208,69 @@ def _read_props(path):
     return kvs
 
 
+IOLink = namedtuple(
+    "IOLink",
+    [
+        "type",  # CRAT IO link type, see IOLINK_TYPE_*
+        "node_from",  # KFD topology node ID
+        "node_to",  # KFD topology node ID
+        "weight",  # relative link cost, lower is better
+        "min_latency",
+        "max_latency",
+        "min_bandwidth",
+        "max_bandwidth",
+    ],
+)
+
+
+# values of the IO link "type" property, from kfd_crat.h
+IOLINK_TYPE_UNDEFINED = 0
+IOLINK_TYPE_HYPERTRANSPORT = 1
+IOLINK_TYPE_PCIEXPRESS = 2
+IOLINK_TYPE_XGMI = 11
+
+
+def _read_links(path):
+    links = []
+
+    try:
+        link_dirs = os.listdir(path)
+    except FileNotFoundError:
+        return links
+
+    for link_dir in sorted(link_dirs, key=int):
+        props = _read_props(os.path.join(path, link_dir, "properties"))
+        links.append(IOLink(*[props.get(f) for f in IOLink._fields]))
+
+    return links
+
+
 class KFDNode:
 
     def __init__(self, path):
         self.path = path
+        self._properties = None
+
+    @property
+    def node_id(self):
+        return int(os.path.basename(self.path))
 
     @property
     def properties(self):
-        return _read_props(os.path.join(self.path, "properties"))
+        # topology properties are static for the life of the driver,
+        # so parse the file once per node
+        if self._properties is None:
+            self._properties = _read_props(os.path.join(self.path, "properties"))
+
+        return self._properties
+
+    @property
+    def io_links(self):
+        return _read_links(os.path.join(self.path, "io_links"))
+
+    @property
+    def p2p_links(self):
+        return _read_links(os.path.join(self.path, "p2p_links"))
 
     @property
     def gpu_id(self):
@@ -206,9 +307,6 @@ def _iter_kfd_devices():
     return gpus
 
 
-unique_to_kfd = {s.unique_id: s for s in _iter_kfd_devices()}
-
-
 # cat /proc/3766769/fdinfo/8
 fdinfo_sample = """
 pos:    0
@@ -232,20 +330,39 @@ amd-requested-gtt:      56 KiB
 
 
 def read_process_fdinfos(pid):
-    parent = "/proc/%d/fdinfo" % pid
+    parent = os.path.join(PROC, str(pid), "fdinfo")
 
     vram_kib = 0
 
     for fdinfo in os.listdir(parent):
         kvs = {}
 
-        with open(os.path.join(parent, fdinfo), "r") as fd:
-            for line in fd.readlines():
-                key, rest = line.strip().split(":", 1)
-                if key == "drm-memory-vram":
-                    kib, _ = rest.strip().split(" ")
-                    vram_kib += int(kib)
+        try:
+            with open(os.path.join(parent, fdinfo), "r") as fd:
+                lines = fd.readlines()
+        except FileNotFoundError:
+            # fd closed since the directory was listed
+            continue
+
+        for line in lines:
+            key, rest = line.strip().split(":", 1)
+            if key == "drm-memory-vram":
+                kib, _ = rest.strip().split(" ")
+                vram_kib += int(kib)
 
-                kvs[key] = rest.strip()
+            kvs[key] = rest.strip()
 
     return vram_kib
+
+
+def read_processes_fdinfos(pids, workers=None):
+    """Return {pid: VRAM KiB from fdinfo} for `pids`, skipping exited processes."""
+
+    def read(pid):
+        try:
+            return read_process_fdinfos(pid)
+        except _EXITED:
+            return None
+
+    res = _map_pids(read, pids, workers)
+    return {pid: res[pid] for pid in sorted(res) if res[pid] is not None}
@@ -0,0 +1,253 @@
+# Copyright 2024 Mathew Odden <mathewrodden@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import operator
+from collections import namedtuple
+
+
+LOG = logging.getLogger(__name__)
+
+
+Rule = namedtuple(
+    "Rule",
+    [
+        "name",
+        "kind",  # "threshold", "rate" or "bits"
+        "field",  # attribute of the sample, e.g. "temperature_hotspot"
+        "op",  # ">", ">=", "<" or "<=", unused for "bits"
+        "value",  # threshold, per second rate, or bit mask
+        "clear",  # value at which a firing rule resolves, defaults to `value`
+        "duration",  # seconds the condition must hold before firing
+    ],
+)
+
+Event = namedtuple(
+    "Event",
+    [
+        "timestamp",
+        "rule",  # Rule.name
+        "key",  # device the sample came from, e.g. bus_id
+        "value",  # field value (or rate) that caused the transition
+        "state",  # FIRING or RESOLVED
+    ],
+)
+
+FIRING = "firing"
+RESOLVED = "resolved"
+
+_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+# comparison used to decide a firing rule has resolved at its clear level
+_CLEAR_OPS = {
+    ">": operator.le,
+    ">=": operator.lt,
+    "<": operator.ge,
+    "<=": operator.gt,
+}
+
+
+def threshold(name, field, op, value, clear=None, duration=0.0):
+    """Fire while `field op value`, resolving once it is back past `clear`."""
+    return Rule(name, "threshold", field, op, value, clear, duration)
+
+
+def rate(name, field, op, per_second, clear=None, duration=0.0):
+    """Fire while the change of `field` per second satisfies `op per_second`."""
+    return Rule(name, "rate", field, op, per_second, clear, duration)
+
+
+def bits(name, field, mask, duration=0.0):
+    """Fire while any bit of `mask` is set in `field`, e.g. throttle_status."""
+    return Rule(name, "bits", field, None, mask, None, duration)
+
+
+def _compile_condition(rule):
+    """Return (fire, resolve) predicates on a value for `rule`."""
+
+    if rule.kind == "bits":
+        mask = rule.value
+        return (lambda v: (int(v) & mask) != 0), (lambda v: (int(v) & mask) == 0)
+
+    if rule.kind not in ("threshold", "rate"):
+        raise ValueError("unknown rule kind %r for %r" % (rule.kind, rule.name))
+
+    if rule.op not in _OPS:
+        raise ValueError("unknown operator %r for %r" % (rule.op, rule.name))
+
+    fire_op = _OPS[rule.op]
+    clear_op = _CLEAR_OPS[rule.op]
+    fire_at = rule.value
+    clear_at = rule.value if rule.clear is None else rule.clear
+
+    # a clear level on the firing side would resolve and refire every sample
+    if fire_op(clear_at, fire_at) and clear_at != fire_at:
+        raise ValueError(
+            "clear level %r of %r must not be %s %r"
+            % (clear_at, rule.name, rule.op, fire_at)
+        )
+
+    return (lambda v: fire_op(v, fire_at)), (lambda v: clear_op(v, clear_at))
+
+
+class _Evaluator:
+    """Compiled rule with its per device state."""
+
+    __slots__ = ("rule", "fire", "resolve", "firing", "pending")
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.fire, self.resolve = _compile_condition(rule)
+        self.firing = set()  # keys currently firing
+        self.pending = {}  # key -> time the condition started holding
+
+    def step(self, ts, key, v, emit):
+        if key in self.firing:
+            if self.resolve(v):
+                self.firing.discard(key)
+                emit(Event(ts, self.rule.name, key, v, RESOLVED))
+            return
+
+        if not self.fire(v):
+            self.pending.pop(key, None)
+            return
+
+        since = self.pending.setdefault(key, ts)
+        if ts - since >= self.rule.duration:
+            del self.pending[key]
+            self.firing.add(key)
+            emit(Event(ts, self.rule.name, key, v, FIRING))
+
+
+def _extract(sample, field):
+    if isinstance(sample, dict):
+        v = sample.get(field)
+    else:
+        v = getattr(sample, field, None)
+
+    if v is None or isinstance(v, (int, float)):
+        return v
+
+    # per instance arrays such as temperature_hbm, use the worst one
+    return max(v)
+
+
+class _SnapshotView:
+    """Flat field access over a DeviceSnapshot and its decoded metrics."""
+
+    __slots__ = ("dev", "metrics")
+
+    def __init__(self, dev):
+        self.dev = dev
+        self.metrics = dev.metrics()
+
+    def __getattr__(self, name):
+        if name == "vram_pressure":
+            if self.dev.vram_used is None or not self.dev.vram_total:
+                return None
+            return self.dev.vram_used / self.dev.vram_total
+
+        if name in self.dev._fields:
+            return getattr(self.dev, name)
+
+        return getattr(self.metrics, name, None)
+
+
+class RuleEngine:
+    """Evaluate compiled rules over the samples of all devices at once.
+
+    Rules are grouped by field, so each field is extracted from a sample
+    once no matter how many rules use it, and rates are derived once per
+    field and device. Events go to `sink`, which is either a callable or a
+    queue-like object with put_nowait().
+    """
+
+    def __init__(self, rules, sink):
+        self.rules = list(rules)
+
+        names = [r.name for r in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("rule names must be unique")
+
+        self._emit = sink.put_nowait if hasattr(sink, "put_nowait") else sink
+
+        # field -> evaluators on the raw value and on its rate of change
+        self._levels = {}
+        self._rates = {}
+        for r in self.rules:
+            target = self._rates if r.kind == "rate" else self._levels
+            target.setdefault(r.field, []).append(_Evaluator(r))
+
+        self._fields = sorted(set(self._levels) | set(self._rates))
+        self._prev = {}  # (key, field) -> (timestamp, value) for rates
+
+    def evaluate(self, timestamp, samples):
+        """Run every rule over `samples`, an iterable of (key, sample).
+
+        A sample is a metrics structure, a dict, or any object with the
+        rule fields as attributes. Missing fields are skipped.
+        """
+
+        emit = self._emit
+
+        for key, sample in samples:
+            for field in self._fields:
+                v = _extract(sample, field)
+                if v is None:
+                    continue
+
+                for ev in self._levels.get(field, ()):
+                    ev.step(timestamp, key, v, emit)
+
+                rate_evs = self._rates.get(field)
+                if not rate_evs:
+                    continue
+
+                prev = self._prev.get((key, field))
+                self._prev[(key, field)] = (timestamp, v)
+                if prev is None or timestamp <= prev[0]:
+                    continue
+
+                # *_acc counters restart from zero on a GPU reset, which
+                # would show up as a large negative rate
+                if v < prev[1] and field.endswith("_acc"):
+                    continue
+
+                r = (v - prev[1]) / (timestamp - prev[0])
+                for ev in rate_evs:
+                    ev.step(timestamp, key, r, emit)
+
+    def evaluate_snapshot(self, snap):
+        """Evaluate a NodeSnapshot, keyed by bus_id.
+
+        Besides the DeviceSnapshot and gpu_metrics fields, rules can use
+        `vram_pressure`, the fraction of VRAM in use.
+        """
+
+        self.evaluate(
+            snap.timestamp, ((d.bus_id, _SnapshotView(d)) for d in snap.devices)
+        )
+
+    def firing(self):
+        """Return a dict of rule name to the set of keys it is firing for."""
+        out = {}
+        for evs in list(self._levels.values()) + list(self._rates.values()):
+            for ev in evs:
+                out[ev.rule.name] = set(ev.firing)
+        return out
@@ -0,0 +1,263 @@
+# Copyright 2024 Mathew Odden <mathewrodden@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import math
+import random
+import time
+from collections import namedtuple
+
+import rocmi
+from rocmi import kfd
+
+
+LOG = logging.getLogger(__name__)
+
+
+Sample = namedtuple(
+    "Sample",
+    [
+        "timestamp",  # clock() value when the group was collected
+        "group",  # name of the MetricGroup
+        "device",  # DeviceInfo, or None for node wide groups
+        "value",
+    ],
+)
+
+
+# returned by a collect function to drop a sample, e.g. when it is unchanged
+SKIP = object()
+
+
+class MetricGroup:
+    """A set of attributes that are read together at one interval.
+
+    `collect` is called with a DeviceInfo (or None when `per_device` is
+    False) and returns the sample value, or SKIP to produce no sample.
+    `jitter` is the maximum random delay added to each run, and is capped
+    at half the interval so runs never reorder.
+    """
+
+    def __init__(self, name, interval, collect, jitter=0.0, per_device=True):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+
+        self.name = name
+        self.interval = interval
+        self.collect = collect
+        self.jitter = min(jitter, interval / 2.0)
+        self.per_device = per_device
+
+
+class GPUMetricsGroup(MetricGroup):
+    """MetricGroup for gpu_metrics that skips tables firmware has not refreshed.
+
+    The raw table is read every run, but it is only decoded and emitted
+    when firmware_timestamp or system_clock_counter moved since the
+    previous read of the same device.
+    """
+
+    def __init__(self, interval, jitter=0.0, name="metrics"):
+        super().__init__(name, interval, self._collect, jitter=jitter)
+        self._last = {}
+        self.skipped = 0
+
+    def _collect(self, device):
+        dat = device.read_metrics_raw()
+        stamps = rocmi.metrics_timestamps(dat)
+
+        if self._last.get(device.path) == stamps:
+            self.skipped += 1
+            return SKIP
+
+        self._last[device.path] = stamps
+        return rocmi.decode_metrics(dat)
+
+
+def _collect_static(device):
+    return {
+        "unique_id": device.unique_id,
+        "serial": device.serial,
+        "device_id": device.device_id,
+        "name": device.name,
+    }
+
+
+def _collect_memory(device):
+    return {
+        "vram_used": device.vram_used,
+        "vram_total": device.vram_total,
+    }
+
+
+def _collect_processes(_):
+    return kfd.get_processes()
+
+
+def default_groups():
+    """Return MetricGroups for the usual rates at which attributes change."""
+
+    return [
+        MetricGroup("static", 300.0, _collect_static, jitter=5.0),
+        MetricGroup("memory", 1.0, _collect_memory, jitter=0.1),
+        MetricGroup("processes", 5.0, _collect_processes, jitter=0.5, per_device=False),
+        GPUMetricsGroup(1.0, jitter=0.1),
+    ]
+
+
+class TimerWheel:
+    """Hashed timer wheel with `slots` buckets of `tick` seconds each.
+
+    Scheduling and expiring are O(1) per timer, independent of how many
+    timers are pending; timers further out than one revolution simply stay
+    in their bucket until their due time comes around.
+    """
+
+    def __init__(self, tick, slots):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = None
+
+    def _tick_of(self, when):
+        return int(math.floor(when / self.tick))
+
+    def schedule(self, due, item):
+        t = self._tick_of(due)
+
+        # a timer already in the past goes in the next bucket to be visited
+        if self.current is not None and t <= self.current:
+            t = self.current + 1
+
+        self.slots[t % len(self.slots)].append((due, item))
+
+    def expire(self, now):
+        """Remove and return items due at or before `now`, ordered by due time."""
+
+        end = self._tick_of(now)
+        start = end - len(self.slots) + 1
+        if self.current is not None:
+            start = max(start, self.current + 1)
+
+        expired = []
+        for t in range(start, end + 1):
+            idx = t % len(self.slots)
+            slot = self.slots[idx]
+            if not slot:
+                continue
+
+            keep = []
+            for entry in slot:
+                if entry[0] <= now:
+                    expired.append(entry)
+                else:
+                    keep.append(entry)
+            self.slots[idx] = keep
+
+        # the bucket for `now` may still hold timers due later in this tick,
+        # so it is only considered done once time has moved past it
+        self.current = end - 1
+
+        expired.sort(key=lambda e: e[0])
+        return [item for _, item in expired]
+
+
+class Scheduler:
+    """Run MetricGroups at their own intervals from a single timer.
+
+    Each group keeps a drift free cadence of `interval` seconds, with a
+    random delay of up to `jitter` seconds added to every run so many
+    samplers on a cluster don't hit sysfs in lockstep. Runs that were
+    missed, e.g. because collection took too long, are skipped rather
+    than executed back to back.
+    """
+
+    def __init__(
+        self,
+        groups=None,
+        devices=None,
+        tick=0.05,
+        slots=512,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.devices = devices if devices is not None else rocmi.get_devices()
+        self.clock = clock
+        self.sleep = sleep
+        self.wheel = TimerWheel(tick, slots)
+        self.groups = {}
+        self._base = {}
+
+        for g in groups if groups is not None else default_groups():
+            self.add_group(g)
+
+    def add_group(self, group, start=None):
+        if group.name in self.groups:
+            raise ValueError("duplicate metric group %r" % group.name)
+
+        self.groups[group.name] = group
+        self._base[group.name] = self.clock() if start is None else start
+        self.wheel.schedule(self._base[group.name], group.name)
+
+    def _reschedule(self, group, now):
+        base = self._base[group.name] + group.interval
+        if base <= now:
+            base += group.interval * (math.floor((now - base) / group.interval) + 1)
+
+        self._base[group.name] = base
+        self.wheel.schedule(base + random.random() * group.jitter, group.name)
+
+    def _collect(self, group, device, now):
+        try:
+            value = group.collect(device)
+        except Exception:
+            LOG.warning(
+                "error collecting %r from %s",
+                group.name,
+                device.path if device else "node",
+                exc_info=True,
+            )
+            return None
+
+        if value is SKIP:
+            return None
+
+        return Sample(now, group.name, device, value)
+
+    def run_pending(self):
+        """Collect every group that is due and return the resulting Samples."""
+
+        now = self.clock()
+        samples = []
+
+        for name in self.wheel.expire(now):
+            group = self.groups[name]
+
+            targets = self.devices if group.per_device else [None]
+            for device in targets:
+                s = self._collect(group, device, now)
+                if s is not None:
+                    samples.append(s)
+
+            self._reschedule(group, now)
+
+        return samples
+
+    def run(self, callback, stop=None):
+        """Call `callback` with each Sample until `stop` (a threading.Event) is set."""
+
+        while stop is None or not stop.is_set():
+            for s in self.run_pending():
+                callback(s)
+
+            self.sleep(self.wheel.tick)
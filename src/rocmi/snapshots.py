@@ -0,0 +1,179 @@
+# Copyright 2024 Mathew Odden <mathewrodden@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import time
+from collections import namedtuple
+
+import rocmi
+from rocmi import kfd
+
+
+LOG = logging.getLogger(__name__)
+
+
+class DeviceSnapshot(
+    namedtuple(
+        "DeviceSnapshot",
+        [
+            "bus_id",
+            "unique_id",
+            "serial",
+            "device_id",
+            "name",
+            "vram_used",  # bytes
+            "vram_total",  # bytes
+            "metrics_raw",  # undecoded gpu_metrics table, None if unavailable
+        ],
+    )
+):
+    __slots__ = ()
+
+    def metrics(self):
+        """Return the decoded gpu_metrics structure, or None."""
+        if self.metrics_raw is None:
+            return None
+
+        return rocmi.decode_metrics(self.metrics_raw)
+
+    def to_dict(self):
+        d = self._asdict()
+        del d["metrics_raw"]
+        d["metrics"] = metrics_to_dict(self.metrics())
+        return d
+
+
+class NodeSnapshot(
+    namedtuple(
+        "NodeSnapshot",
+        [
+            "timestamp",  # time.time() when the capture pass started
+            "duration",  # seconds the capture pass took
+            "driver_version",
+            "devices",  # tuple of DeviceSnapshot, ordered by bus_id
+            # tuple of kfd.ComputeProcess ordered by pid, with gpus as a
+            # frozenset and gpu_usage_info as ((gpu_id, ((typ, val), ...)), ...)
+            "processes",
+        ],
+    )
+):
+    __slots__ = ()
+
+    def to_dict(self):
+        """Return the snapshot as plain types, suitable for json.dumps."""
+        return {
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "driver_version": self.driver_version,
+            "devices": [d.to_dict() for d in self.devices],
+            "processes": [_process_to_dict(p) for p in self.processes],
+        }
+
+
+def metrics_to_dict(m):
+    if m is None:
+        return None
+
+    d = {}
+    for f, _ in m._fields_:
+        if f.startswith("_") or f == "metrics_header":
+            continue
+
+        v = getattr(m, f)
+        if not isinstance(v, int):
+            v = list(v)
+        d[f] = v
+
+    return d
+
+
+def _process_to_dict(p):
+    d = p._asdict()
+    d["gpus"] = sorted(p.gpus)
+    d["gpu_usage_info"] = {str(k): dict(v) for k, v in p.gpu_usage_info}
+    return d
+
+
+def _freeze_usage(gpu_usage_info):
+    return tuple(
+        (gpu_id, tuple(sorted(usage.items())))
+        for gpu_id, usage in sorted(gpu_usage_info.items())
+    )
+
+
+def _read_or_none(fn):
+    try:
+        return fn()
+    except (OSError, NotImplementedError):
+        return None
+
+
+def snapshot(devices=None):
+    """Capture a consistent point-in-time view of every device on the node.
+
+    Identity attributes don't change, so they are read up front. The values
+    that do change (VRAM usage, gpu_metrics, the KFD process table) are then
+    read in one ordered pass with nothing else in between, and gpu_metrics
+    is kept undecoded until asked for to keep that pass short.
+    """
+
+    if devices is None:
+        devices = rocmi.get_devices()
+
+    idents = [
+        (
+            d.bus_id,
+            _read_or_none(lambda: d.unique_id),
+            d.serial,
+            _read_or_none(lambda: d.device_id),
+            _read_or_none(lambda: d.name),
+        )
+        for d in devices
+    ]
+    driver_version = rocmi.get_driver_version()
+
+    start = time.time()
+
+    dynamic = [
+        (
+            _read_or_none(lambda: d.vram_used),
+            _read_or_none(lambda: d.vram_total),
+            _read_or_none(d.read_metrics_raw),
+        )
+        for d in devices
+    ]
+    processes = kfd.get_processes()
+
+    duration = time.time() - start
+
+    processes = tuple(
+        sorted(
+            (
+                p._replace(
+                    gpus=frozenset(p.gpus),
+                    gpu_usage_info=_freeze_usage(p.gpu_usage_info),
+                )
+                for p in processes
+            ),
+            key=lambda p: p.pid,
+        )
+    )
+
+    return NodeSnapshot(
+        timestamp=start,
+        duration=duration,
+        driver_version=driver_version,
+        devices=tuple(DeviceSnapshot(*(i + d)) for i, d in zip(idents, dynamic)),
+        processes=processes,
+    )
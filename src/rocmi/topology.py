@@ -0,0 +1,251 @@
+# Copyright 2024 Mathew Odden <mathewrodden@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+from collections import deque, namedtuple
+
+from rocmi.kfd import IOLINK_TYPE_XGMI, KFDNode
+
+
+LOG = logging.getLogger(__name__)
+
+TOPOLOGY_NODES = "/sys/class/kfd/kfd/topology/nodes"
+
+
+TopologyNode = namedtuple(
+    "TopologyNode",
+    [
+        "node_id",  # KFD topology node ID
+        "gpu_id",  # KFD gpu_id, 0 for CPU nodes
+        "unique_id",  # hex string, None for CPU nodes
+        "hive_id",  # XGMI hive, 0 if not part of a hive
+        "numa_node",  # NUMA node the device is local to, None if unknown
+        "properties",  # dict of the node properties file
+    ],
+)
+
+
+class Topology:
+    """Immutable view of the KFD topology graph.
+
+    Everything is read from sysfs once at construction time and the
+    query methods only touch in-memory structures, so they are cheap
+    enough to call from placement decisions in a hot loop.
+    """
+
+    def __init__(self, kfd_nodes):
+        kfd_nodes = sorted(kfd_nodes, key=lambda n: n.node_id)
+
+        self._links = {}
+        for kn in kfd_nodes:
+            # io_links always describe the directly attached peers, p2p_links
+            # (newer kernels) add indirect GPU<->GPU paths on top of those
+            for link in kn.io_links + kn.p2p_links:
+                self._links.setdefault((link.node_from, link.node_to), link)
+
+        self._adjacent = {kn.node_id: set() for kn in kfd_nodes}
+        for a, b in self._links:
+            if a in self._adjacent and b in self._adjacent:
+                self._adjacent[a].add(b)
+
+        gpus = []
+        cpus = []
+        for kn in kfd_nodes:
+            if kn.properties.get("simd_count", 0) > 0:
+                gpus.append(kn)
+            else:
+                cpus.append(kn)
+
+        # KFD enumerates CPU nodes in proximity domain order, so the
+        # position of a CPU node is its NUMA node
+        cpu_numa = {kn.node_id: i for i, kn in enumerate(cpus)}
+
+        self.nodes = {}
+        for kn in cpus:
+            self.nodes[kn.node_id] = self._make_node(kn, cpu_numa[kn.node_id])
+
+        for kn in gpus:
+            local = [
+                link
+                for link in self._links.values()
+                if link.node_from == kn.node_id and link.node_to in cpu_numa
+            ]
+            local.sort(key=lambda l: (l.weight or 0, l.node_to))
+            numa = cpu_numa[local[0].node_to] if local else None
+            self.nodes[kn.node_id] = self._make_node(kn, numa)
+
+        self.gpus = tuple(kn.node_id for kn in gpus)
+        self.cpus = tuple(kn.node_id for kn in cpus)
+
+        self._by_gpu_id = {self.nodes[n].gpu_id: n for n in self.gpus}
+        self._by_unique_id = {self.nodes[n].unique_id: n for n in self.gpus}
+
+        self._numa_gpus = {}
+        for n in self.gpus:
+            self._numa_gpus.setdefault(self.nodes[n].numa_node, []).append(n)
+        self._numa_gpus = {k: tuple(v) for k, v in self._numa_gpus.items()}
+
+        peers = {n: set() for n in self.gpus}
+        for (a, b), link in self._links.items():
+            if link.type == IOLINK_TYPE_XGMI and a in peers and b in peers:
+                peers[a].add(b)
+        self._xgmi_peers = {k: frozenset(v) for k, v in peers.items()}
+
+        self._hops = {n: self._bfs(n) for n in self._adjacent}
+
+    @staticmethod
+    def _make_node(kn, numa_node):
+        props = kn.properties
+        unique_id = kn.unique_id if props.get("simd_count", 0) > 0 else None
+
+        return TopologyNode(
+            node_id=kn.node_id,
+            gpu_id=kn.gpu_id,
+            unique_id=unique_id,
+            hive_id=props.get("hive_id", 0),
+            numa_node=numa_node,
+            properties=props,
+        )
+
+    def _bfs(self, start):
+        hops = {start: 0}
+        queue = deque([start])
+
+        while queue:
+            cur = queue.popleft()
+            for nxt in self._adjacent[cur]:
+                if nxt not in hops:
+                    hops[nxt] = hops[cur] + 1
+                    queue.append(nxt)
+
+        return hops
+
+    @classmethod
+    def from_sysfs(cls, parent=TOPOLOGY_NODES):
+        nodes = []
+        for node in os.listdir(parent):
+            try:
+                int(node)
+            except ValueError:
+                continue
+
+            nodes.append(KFDNode(os.path.join(parent, node)))
+
+        return cls(nodes)
+
+    def node_for_gpu_id(self, gpu_id):
+        """Return the node ID for a KFD gpu_id, as found in process tables."""
+        return self._by_gpu_id.get(gpu_id)
+
+    def node_for_unique_id(self, unique_id):
+        """Return the node ID for a device unique_id hex string."""
+        return self._by_unique_id.get(unique_id)
+
+    def link(self, node_from, node_to):
+        """Return the IOLink between two nodes, or None if not directly linked."""
+        return self._links.get((node_from, node_to))
+
+    def hops(self, node_from, node_to):
+        """Return number of links on the shortest path, or None if unreachable."""
+        return self._hops.get(node_from, {}).get(node_to)
+
+    def numa_node(self, node_id):
+        return self.nodes[node_id].numa_node
+
+    def gpus_on_numa(self, numa_node):
+        """Return node IDs of GPUs local to NUMA node `numa_node`."""
+        return self._numa_gpus.get(numa_node, ())
+
+    def xgmi_peers(self, node_id):
+        """Return node IDs of GPUs with a direct XGMI link to `node_id`."""
+        return self._xgmi_peers.get(node_id, frozenset())
+
+    def best_xgmi_set(self, k, candidates=None):
+        """Return the best set of `k` GPUs that are all XGMI connected.
+
+        The returned tuple of node IDs forms a clique of XGMI links with the
+        lowest total link weight among GPUs in `candidates` (all GPUs if not
+        given). Returns None if no such set exists.
+        """
+
+        if k < 1:
+            return None
+
+        if candidates is None:
+            candidates = self.gpus
+        candidates = frozenset(candidates)
+
+        # a member of a k-clique needs at least k-1 peers
+        pool = sorted(
+            n for n in candidates if len(self.xgmi_peers(n) & candidates) >= k - 1
+        )
+        if len(pool) < k:
+            return None
+
+        weights = {}
+        for a in pool:
+            for b in self._xgmi_peers[a]:
+                if b in candidates:
+                    weights[(a, b)] = self._links[(a, b)].weight or 0
+
+        # every edge still missing from a partial clique weighs at least this
+        min_weight = min(weights.values(), default=0)
+        edges = k * (k - 1) // 2
+        best = [None, None]
+
+        def extend(clique, weight, rest):
+            size = len(clique)
+            if size == k:
+                if best[0] is None or weight < best[1]:
+                    best[0], best[1] = tuple(clique), weight
+                return
+
+            if best[0] is not None:
+                missing = edges - size * (size - 1) // 2
+                if weight + missing * min_weight >= best[1]:
+                    return
+
+            for i, n in enumerate(rest):
+                if len(rest) - i < k - size:
+                    return
+
+                peers = self._xgmi_peers[n]
+                nxt = [m for m in rest[i + 1 :] if m in peers]
+                if len(nxt) < k - size - 1:
+                    continue
+
+                added = sum(weights[(c, n)] for c in clique)
+                extend(clique + [n], weight + added, nxt)
+
+                # nothing can beat a clique made of the lightest links
+                if best[0] is not None and best[1] <= edges * min_weight:
+                    return
+
+        extend([], 0, pool)
+        return best[0]
+
+
+_topology = None
+
+
+def get_topology(refresh=False):
+    """Return the cached system Topology, reading sysfs on first use."""
+
+    global _topology
+
+    if _topology is None or refresh:
+        _topology = Topology.from_sysfs()
+
+    return _topology
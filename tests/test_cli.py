@@ -0,0 +1,128 @@
+import io
+import json
+from unittest import mock
+
+from pyfakefs.fake_filesystem_unittest import TestCase
+
+
+CARD = "/sys/devices/pci0000:00/0000:05:00.0"
+
+
+class CLITestCase(TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir("/sys/class/kfd/kfd/topology/nodes")
+
+        for pid, name in ((4444, b"trainer"), (5555, b"server")):
+            self.fs.create_file("/proc/%d/comm" % pid, contents=name)
+            self.fs.create_file(
+                "/sys/class/kfd/kfd/proc/%d/pasid" % pid, contents=b"1234"
+            )
+            self.fs.create_dir("/sys/class/kfd/kfd/proc/%d/queues" % pid)
+
+        self.fs.create_file(CARD + "/vendor", contents=b"0x1002")
+        self.fs.create_file(CARD + "/unique_id", contents=b"aaaaaaaaaaaaaaaa")
+        self.fs.create_file(CARD + "/device", contents=b"0x738c")
+        self.fs.create_symlink("/sys/class/drm/card0/device", CARD)
+
+        # have to import after patching filesystem
+        global cli
+        from rocmi import cli
+
+        # the topology is cached on first use, start each test without one
+        patcher = mock.patch.object(cli.topology, "_topology", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with mock.patch("sys.argv", ["rocmi"] + list(argv)), mock.patch(
+            "sys.stdout", out
+        ):
+            cli.main()
+
+        return out.getvalue()
+
+    def test_ndjson_selected_fields(self):
+        out = self.run_cli(
+            "list-processes", "--output", "ndjson", "--fields", "pid,name"
+        )
+
+        lines = [json.loads(l) for l in out.splitlines()]
+        self.assertEqual(
+            lines,
+            [{"pid": 4444, "name": "trainer"}, {"pid": 5555, "name": "server"}],
+        )
+
+    def test_unrequested_fields_not_read(self):
+        # a missing comm file would raise if the name column were evaluated
+        self.fs.remove("/proc/5555/comm")
+
+        out = self.run_cli("list-processes", "--output", "csv", "--fields", "pid,pasid")
+
+        self.assertEqual(out.split(), ["pid,pasid", "4444,1234", "5555,1234"])
+
+    def test_json_is_valid_document(self):
+        out = self.run_cli("list-processes", "--output", "json", "--fields", "pid,gpus")
+
+        self.assertEqual(
+            json.loads(out),
+            [{"pid": 4444, "gpus": None}, {"pid": 5555, "gpus": None}],
+        )
+
+    def test_exited_process_skipped(self):
+        # process exited after /sys/class/kfd/kfd/proc was listed
+        self.fs.remove("/proc/5555/comm")
+
+        for output in ("csv", "json"):
+            out = self.run_cli(
+                "list-processes", "--output", output, "--fields", "pid,name"
+            )
+            self.assertIn("4444", out)
+            self.assertNotIn("5555", out)
+
+    def test_exited_process_skipped_in_device_processes(self):
+        for pid in (4444, 5555):
+            self.fs.create_file(
+                "/sys/class/kfd/kfd/proc/%d/queues/0/gpuid" % pid, contents=b"42700"
+            )
+        self.fs.remove("/proc/4444/comm")
+
+        node = "/sys/class/kfd/kfd/topology/nodes/1"
+        self.fs.create_file(node + "/gpu_id", contents=b"42700")
+        self.fs.create_file(
+            node + "/properties",
+            contents="simd_count 304\nunique_id %d\n" % 0xAAAAAAAAAAAAAAAA,
+        )
+
+        out = self.run_cli(
+            "list-devices", "--output", "ndjson", "--fields", "index,processes"
+        )
+
+        self.assertEqual(json.loads(out), {"index": 0, "processes": ["server(5555)"]})
+
+    def test_bus_id_only_listing_is_lazy(self):
+        # none of these may be touched when only bus_id is requested: there
+        # is no product_name or pci.ids, so name would raise as well
+        self.fs.remove(CARD + "/unique_id")
+        self.fs.remove("/proc/4444/comm")
+
+        out = self.run_cli(
+            "list-devices", "--output", "csv", "--fields", "index,bus_id"
+        )
+
+        self.assertEqual(out.split(), ["index,bus_id", "0,0000:05:00.0"])
+
+    def test_list_devices_table(self):
+        out = self.run_cli("list-devices", "--fields", "id,bus_id,processes")
+
+        self.assertIn("| ID ", out)
+        self.assertIn("aaaaaaaaaaaaaaaa", out)
+        # no KFD node matches this card, so it has no processes
+        self.assertIn("[]", out)
+
+    def test_fields_type_rejects_unknown(self):
+        parse = cli._fields_type(cli.PROCESS_FIELDS)
+        self.assertEqual(parse("PID, vram"), ["pid", "vram"])
+        with self.assertRaises(Exception):
+            parse("pid,bogus")
@@ -0,0 +1,99 @@
+import math
+
+from pyfakefs.fake_filesystem_unittest import TestCase
+
+
+def fill(store, key, start, seconds, fn):
+    for t in range(start, start + seconds):
+        store.add(key, float(t), {"temp": fn(t), "power": 100.0})
+
+
+class HistoryTestCase(TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir("/sys/class/kfd/kfd/topology/nodes")
+
+        # have to import after patching filesystem
+        global history
+        from rocmi import history
+
+        self.store = history.HistoryStore(
+            fields=["temp", "power"],
+            tiers=[history.Tier(10, 6), history.Tier(60, 10)],
+            raw_capacity=20,
+        )
+
+    def test_raw_query(self):
+        fill(self.store, "gpu0", 0, 100, lambda t: t)
+
+        res = self.store.query("gpu0", "temp", 85, 90)
+        self.assertIsNone(res.resolution)
+        self.assertEqual([p.last for p in res.points], [85, 86, 87, 88, 89])
+
+    def test_picks_tier_covering_start(self):
+        fill(self.store, "gpu0", 0, 100, lambda t: t)
+
+        # raw only goes back to 80, the 10s tier to 30
+        res = self.store.query("gpu0", "temp", 50, 100)
+        self.assertEqual(res.resolution, 10)
+        self.assertEqual([p.timestamp for p in res.points], [50, 60, 70, 80, 90])
+        self.assertEqual(res.points[0], history.Point(50, 50, 59, 54.5, 59))
+
+        res = self.store.query("gpu0", "temp", 0, 100)
+        self.assertEqual(res.resolution, 60)
+        self.assertEqual(res.points[0], history.Point(0, 0, 59, 29.5, 59))
+        self.assertEqual(res.points[1].max, 99)
+
+    def test_window_before_first_sample(self):
+        fill(self.store, "gpu0", 1000, 15, lambda t: t)
+
+        # nothing has been overwritten yet, so raw still covers the window
+        for start in (0, 995):
+            res = self.store.query("gpu0", "temp", start, 1020)
+            self.assertIsNone(res.resolution)
+            self.assertEqual(len(res.points), 15)
+
+        # raw has wrapped, the 10s tier has not
+        fill(self.store, "gpu0", 1015, 35, lambda t: t)
+        res = self.store.query("gpu0", "temp", 0, 1050)
+        self.assertEqual(res.resolution, 10)
+        self.assertEqual(
+            [p.timestamp for p in res.points], [1000, 1010, 1020, 1030, 1040]
+        )
+
+    def test_max_points_coarsens(self):
+        fill(self.store, "gpu0", 0, 100, lambda t: t)
+
+        res = self.store.query("gpu0", "temp", 85, 95, max_points=3)
+        self.assertEqual(res.resolution, 10)
+
+    def test_missing_fields_ignored_in_rollup(self):
+        self.store.add("gpu0", 0.0, {"temp": 1})
+        self.store.add("gpu0", 1.0, {"temp": 3, "power": 50})
+
+        res = self.store.query("gpu0", "power", 0, 10)
+        self.assertIsNone(res.resolution)
+        self.assertTrue(math.isnan(res.points[0].last))
+
+        p = self.store.query("gpu0", "power", 0, 10, max_points=1).points[0]
+        self.assertEqual((p.min, p.max, p.mean, p.last), (50, 50, 50, 50))
+
+    def test_out_of_order_dropped(self):
+        self.store.add("gpu0", 10.0, {"temp": 1})
+        self.store.add("gpu0", 5.0, {"temp": 2})
+
+        res = self.store.query("gpu0", "temp", 0, 20)
+        self.assertEqual([p.last for p in res.points], [1])
+
+    def test_fixed_footprint(self):
+        expected = self.store.bytes_per_key()
+        self.assertEqual(expected, 8 * (20 * 3 + 6 * 9 + 10 * 9))
+
+        fill(self.store, "gpu0", 0, 10, lambda t: t)
+        self.assertEqual(self.store.nbytes, expected)
+        fill(self.store, "gpu0", 10, 5000, lambda t: t)
+        fill(self.store, "gpu1", 0, 10, lambda t: t)
+        self.assertEqual(self.store.nbytes, 2 * expected)
+
+    def test_unknown_key(self):
+        self.assertEqual(self.store.query("nope", "temp", 0, 1).points, [])
@@ -0,0 +1,124 @@
+from unittest import mock
+
+from pyfakefs.fake_filesystem_unittest import TestCase
+
+
+class InstrumentTestCase(TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir("/sys/class/kfd/kfd/topology/nodes")
+
+        self.fs.create_file("/proc/4444/comm", contents=b"test-process")
+        self.fs.create_file("/sys/class/kfd/kfd/proc/4444/pasid", contents=b"1234")
+        self.fs.create_file("/sys/class/kfd/kfd/proc/4444/vram_42700", contents=b"4096")
+        self.fs.create_dir("/sys/class/kfd/kfd/proc/4444/queues")
+        self.fs.create_file("/sys/class/drm/card0/device/vendor", contents=b"0x1002")
+
+        # have to import after patching filesystem
+        global rocmi, instrument, kfd
+        import rocmi
+        from rocmi import instrument, kfd
+
+        instrument.reset()
+        self.addCleanup(instrument.disable)
+
+    def test_counts_per_class(self):
+        with instrument.profiling():
+            kfd.get_processes()
+
+        st = instrument.stats()
+        self.assertEqual(st["kfd_proc"].opens, 2)
+        self.assertEqual(st["kfd_proc"].bytes, len("1234") + len("4096"))
+        self.assertEqual(st["kfd_proc"].listdirs, 3)
+        self.assertEqual(sum(st["kfd_proc"].histogram), 5)
+        self.assertEqual(st["proc_comm"].opens, 1)
+        self.assertEqual(sum(st["proc_comm"].histogram), 1)
+
+    def test_errors_counted(self):
+        self.fs.remove("/proc/4444/comm")
+
+        with instrument.profiling():
+            self.assertEqual(kfd.get_processes(), [])
+
+        st = instrument.stats()
+        self.assertEqual(st["proc_comm"].errors, 1)
+
+    def test_disabled_is_untouched(self):
+        with instrument.profiling():
+            self.assertTrue(instrument.is_enabled())
+
+        self.assertFalse(instrument.is_enabled())
+        self.assertNotIn("open", vars(kfd))
+        kfd.get_processes()
+        self.assertEqual(instrument.stats(), {})
+
+    def test_nested_profiling(self):
+        with instrument.profiling():
+            with instrument.profiling():
+                kfd.get_processes()
+
+            # the outer block is still counting
+            self.assertTrue(instrument.is_enabled())
+            self.assertIn("open", vars(kfd))
+            kfd.get_processes()
+
+        self.assertFalse(instrument.is_enabled())
+        self.assertNotIn("open", vars(kfd))
+        self.assertEqual(instrument.stats()["proc_comm"].opens, 2)
+
+    def test_classify(self):
+        cases = {
+            "/sys/class/drm/card0/device/gpu_metrics": "gpu_metrics",
+            "/sys/class/drm/card0/device/unique_id": "drm",
+            "/sys/class/drm/card0/device/hwmon/hwmon3/power1_cap": "hwmon",
+            "/proc/12/fdinfo/4": "proc_fdinfo",
+            "/usr/share/misc/pci.ids": "pci_ids",
+            "/tmp/x": "other",
+        }
+        for path, cls in cases.items():
+            self.assertEqual(instrument.classify(path), cls)
+
+    def test_report(self):
+        with instrument.profiling():
+            kfd.get_processes()
+
+        lines = instrument.report().splitlines()
+        self.assertTrue(lines[0].startswith("CLASS"))
+        self.assertEqual(len(lines), 3)
+
+    def test_discovery_latency_recorded(self):
+        with instrument.profiling():
+            self.assertEqual(len(rocmi.get_devices()), 1)
+
+        st = instrument.stats()["drm"]
+        self.assertEqual(st.opens, 1)
+        self.assertEqual(st.listdirs, 3)
+        # one open and three listings
+        self.assertEqual(sum(st.histogram), 4)
+
+    def test_topology_walk_counted(self):
+        node = "/sys/class/kfd/kfd/topology/nodes/1"
+        self.fs.create_file(node + "/gpu_id", contents=b"42700")
+        self.fs.create_file(
+            node + "/properties", contents=b"simd_count 304\nunique_id 1\n"
+        )
+        self.fs.create_file(
+            "/sys/class/drm/card0/device/unique_id", contents=b"0000000000000001"
+        )
+
+        # the walk happens on first use, not when rocmi is imported
+        with mock.patch.object(rocmi.topology, "_topology", None):
+            with instrument.profiling():
+                dev = rocmi.get_devices()[0]
+                self.assertEqual(dev.get_processes(), [])
+
+        st = instrument.stats()["kfd_topology"]
+        self.assertEqual(st.opens, 2)
+        self.assertGreater(st.listdirs, 0)
+
+    def test_report_without_latencies(self):
+        st = instrument.IOStats(1, 0, 0, 0, 0, 0.0, (0,) * 19)
+
+        line = instrument.report({"drm": st}).splitlines()[1]
+        self.assertNotIn("None", line)
+        self.assertTrue(line.endswith("-"))
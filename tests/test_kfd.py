@@ -76,3 +76,43 @@ class KFDTestCase(TestCase):
     def test_iter_kfd_nodes_count(self):
         devs = kfd._iter_kfd_devices()
         self.assertEqual(len(devs), 1)
+
+    def create_process(self, pid, gpu_id=42700):
+        self.fs.create_file("/proc/%d/comm" % pid, contents=b"proc-%d" % pid)
+        parent = "/sys/class/kfd/kfd/proc/%d" % pid
+        self.fs.create_file(parent + "/pasid", contents=str(pid + 1))
+        self.fs.create_file(parent + "/vram_%d" % gpu_id, contents=b"4096")
+        self.fs.create_file(parent + "/queues/0/gpuid", contents=str(gpu_id))
+
+    def test_get_processes_parallel_matches_serial(self):
+        for pid in range(100, 140):
+            self.create_process(pid)
+
+        serial = kfd.get_processes()
+        parallel = kfd.get_processes(workers=4)
+
+        self.assertEqual([p.pid for p in serial], list(range(100, 140)))
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel[0].gpus, {42700})
+        self.assertEqual(parallel[0].vram_usage, 4096)
+
+    def test_get_processes_tolerates_exit(self):
+        for pid in (100, 101, 102):
+            self.create_process(pid)
+
+        # process exited after /sys/class/kfd/kfd/proc was listed
+        self.fs.remove("/proc/101/comm")
+
+        for workers in (None, 2):
+            pids = [p.pid for p in kfd.get_processes(workers=workers)]
+            self.assertEqual(pids, [100, 102])
+
+    def test_read_processes_fdinfos(self):
+        self.fs.create_file(
+            "/proc/100/fdinfo/5", contents="pos: 0\ndrm-memory-vram: 76 KiB\n"
+        )
+        self.fs.create_file(
+            "/proc/100/fdinfo/6", contents="pos: 0\ndrm-memory-vram: 24 KiB\n"
+        )
+
+        self.assertEqual(kfd.read_processes_fdinfos([100, 999], workers=2), {100: 100})
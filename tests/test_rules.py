@@ -0,0 +1,101 @@
+import queue
+
+from pyfakefs.fake_filesystem_unittest import TestCase
+
+
+class RulesTestCase(TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir("/sys/class/kfd/kfd/topology/nodes")
+
+        # have to import after patching filesystem
+        global rules
+        from rocmi import rules
+
+        self.events = []
+
+    def engine(self, *rs):
+        return rules.RuleEngine(rs, self.events.append)
+
+    def states(self):
+        return [(e.timestamp, e.rule, e.key, e.state) for e in self.events]
+
+    def test_threshold_with_hysteresis(self):
+        e = self.engine(rules.threshold("hot", "temp", ">", 90, clear=80))
+
+        for ts, temp in enumerate([85, 95, 85, 79, 91]):
+            e.evaluate(ts, [("gpu0", {"temp": temp}), ("gpu1", {"temp": 20})])
+
+        self.assertEqual(
+            self.states(),
+            [
+                (1, "hot", "gpu0", rules.FIRING),
+                (3, "hot", "gpu0", rules.RESOLVED),
+                (4, "hot", "gpu0", rules.FIRING),
+            ],
+        )
+
+    def test_duration(self):
+        e = self.engine(rules.threshold("hot", "temp", ">=", 90, duration=2))
+
+        for ts, temp in enumerate([95, 95, 80, 95, 95, 95]):
+            e.evaluate(ts, [("gpu0", {"temp": temp})])
+
+        self.assertEqual(self.states(), [(5, "hot", "gpu0", rules.FIRING)])
+
+    def test_rate(self):
+        e = self.engine(rules.rate("replays", "pcie_replay_count_acc", ">", 5))
+
+        for ts, count in [(0, 100), (10, 110), (20, 200), (30, 201)]:
+            e.evaluate(ts, [("gpu0", {"pcie_replay_count_acc": count})])
+
+        self.assertEqual(
+            self.states(),
+            [
+                (20, "replays", "gpu0", rules.FIRING),
+                (30, "replays", "gpu0", rules.RESOLVED),
+            ],
+        )
+        self.assertEqual(self.events[0].value, 9)
+
+    def test_rate_ignores_accumulator_reset(self):
+        e = self.engine(rules.rate("stalled", "pcie_replay_count_acc", "<", 0))
+
+        for ts, count in [(0, 100), (10, 110), (20, 0), (30, 5)]:
+            e.evaluate(ts, [("gpu0", {"pcie_replay_count_acc": count})])
+
+        self.assertEqual(self.events, [])
+
+    def test_bits_and_arrays(self):
+        e = self.engine(
+            rules.bits("throttled", "throttle_status", 0x4),
+            rules.threshold("hbm", "temperature_hbm", ">", 90),
+        )
+        e.evaluate(0, [("gpu0", {"throttle_status": 0x6, "temperature_hbm": [80, 95]})])
+
+        self.assertEqual(
+            sorted(self.states()),
+            [(0, "hbm", "gpu0", rules.FIRING), (0, "throttled", "gpu0", rules.FIRING)],
+        )
+        self.assertEqual(e.firing(), {"throttled": {"gpu0"}, "hbm": {"gpu0"}})
+
+    def test_queue_sink(self):
+        q = queue.Queue()
+        e = rules.RuleEngine([rules.threshold("hot", "temp", ">", 1)], q)
+        e.evaluate(0, [("gpu0", {"temp": 2})])
+
+        self.assertEqual(q.get_nowait().rule, "hot")
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            self.engine(rules.threshold("x", "temp", ">", 90, clear=95))
+        with self.assertRaises(ValueError):
+            self.engine(rules.threshold("x", "temp", "<=", 10, clear=5))
+        with self.assertRaises(ValueError):
+            self.engine(rules.rate("x", "temp", "<", 0, clear=-1))
+        with self.assertRaises(ValueError):
+            self.engine(rules.threshold("x", "temp", "!=", 1))
+        with self.assertRaises(ValueError):
+            self.engine(
+                rules.threshold("x", "temp", ">", 1), rules.threshold("x", "t", ">", 1)
+            )
@@ -0,0 +1,104 @@
+from pyfakefs.fake_filesystem_unittest import TestCase
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeDevice:
+    def __init__(self, path):
+        self.path = path
+        self.firmware_timestamp = 1
+
+    def read_metrics_raw(self):
+        m = rocmi.Metrics_1_3()
+        m.metrics_header.content_revision = 3
+        m.firmware_timestamp = self.firmware_timestamp
+        m.system_clock_counter = self.firmware_timestamp * 10
+        m.temperature_hotspot = 55
+        return bytes(m)
+
+
+class SamplerTestCase(TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir("/sys/class/kfd/kfd/topology/nodes")
+
+        # have to import after patching filesystem
+        global rocmi, sampler
+        import rocmi
+        from rocmi import sampler
+
+        self.clock = FakeClock()
+        self.devices = [FakeDevice("/dev0"), FakeDevice("/dev1")]
+
+    def scheduler(self, groups):
+        return sampler.Scheduler(
+            groups=groups, devices=self.devices, tick=0.1, slots=16, clock=self.clock
+        )
+
+    def test_groups_run_at_own_interval(self):
+        calls = []
+        fast = sampler.MetricGroup("fast", 1.0, lambda d: calls.append("fast"))
+        slow = sampler.MetricGroup(
+            "slow", 5.0, lambda d: calls.append("slow"), per_device=False
+        )
+        s = self.scheduler([fast, slow])
+
+        for _ in range(100):
+            s.run_pending()
+            self.clock.now += 0.1
+
+        # 10 seconds, two devices for the fast group
+        self.assertEqual(calls.count("fast"), 20)
+        self.assertEqual(calls.count("slow"), 2)
+
+    def test_jitter_is_bounded(self):
+        seen = []
+        g = sampler.MetricGroup(
+            "jittery", 1.0, lambda d: seen.append(self.clock.now), jitter=10.0
+        )
+        self.assertEqual(g.jitter, 0.5)
+
+        s = self.scheduler([g])
+        for _ in range(200):
+            s.run_pending()
+            self.clock.now += 0.05
+
+        self.assertEqual(len(seen), 20)
+        for prev, cur in zip(seen, seen[1:]):
+            self.assertLess(cur - prev, 1.6)
+
+    def test_missed_runs_are_skipped(self):
+        calls = []
+        s = self.scheduler([sampler.MetricGroup("g", 1.0, calls.append)])
+
+        s.run_pending()
+        self.clock.now += 30.0
+        s.run_pending()
+        s.run_pending()
+
+        self.assertEqual(len(calls), 4)
+
+    def test_unchanged_metrics_skipped(self):
+        g = sampler.GPUMetricsGroup(1.0)
+        s = self.scheduler([g])
+
+        samples = s.run_pending()
+        self.assertEqual(len(samples), 2)
+        self.assertEqual(samples[0].value.temperature_hotspot, 55)
+
+        self.devices[1].firmware_timestamp = 2
+        self.clock.now += 1.0
+        samples = s.run_pending()
+
+        self.assertEqual([x.device.path for x in samples], ["/dev1"])
+        self.assertEqual(g.skipped, 1)
+
+    def test_metrics_timestamps(self):
+        dat = self.devices[0].read_metrics_raw()
+        self.assertEqual(rocmi.metrics_timestamps(dat), (1, 10))
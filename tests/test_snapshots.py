@@ -0,0 +1,88 @@
+import json
+import pickle
+
+from pyfakefs.fake_filesystem_unittest import TestCase
+
+
+DEVICE = "/sys/class/drm/card0/device"
+
+
+class SnapshotTestCase(TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir("/sys/class/kfd/kfd/topology/nodes")
+
+        # have to import after patching filesystem
+        global rocmi
+        import rocmi
+
+        m = rocmi.Metrics_1_3()
+        m.metrics_header.content_revision = 3
+        m.temperature_hotspot = 61
+        m.temperature_hbm[2] = 70
+
+        files = {
+            "unique_id": b"aaaaaaaaaaaaaaaa",
+            "device": b"0x738c",
+            "product_name": b"Instinct MI100",
+            "mem_info_vram_used": b"1024",
+            "mem_info_vram_total": b"4096",
+            "gpu_metrics": bytes(m),
+        }
+        for name, contents in files.items():
+            self.fs.create_file("%s/%s" % (DEVICE, name), contents=contents)
+
+        self.fs.create_file("/proc/4444/comm", contents=b"trainer")
+        self.fs.create_file("/sys/class/kfd/kfd/proc/4444/pasid", contents=b"1234")
+        self.fs.create_dir("/sys/class/kfd/kfd/proc/4444/queues")
+        self.fs.create_file("/sys/class/kfd/kfd/proc/4444/vram_42700", contents=b"4096")
+
+    def test_snapshot(self):
+        snap = rocmi.snapshot([rocmi.DeviceInfo(DEVICE)])
+
+        self.assertEqual(len(snap.devices), 1)
+        dev = snap.devices[0]
+        self.assertEqual(dev.unique_id, "aaaaaaaaaaaaaaaa")
+        self.assertIsNone(dev.serial)
+        self.assertEqual(dev.name, "Instinct MI100")
+        self.assertEqual((dev.vram_used, dev.vram_total), (1024, 4096))
+        self.assertEqual(dev.metrics().temperature_hotspot, 61)
+
+        self.assertEqual([p.pid for p in snap.processes], [4444])
+        self.assertIsInstance(snap.processes[0].gpus, frozenset)
+        self.assertEqual(
+            snap.processes[0].gpu_usage_info, ((42700, (("vram", 4096),)),)
+        )
+
+    def test_snapshot_is_immutable(self):
+        snap = rocmi.snapshot([rocmi.DeviceInfo(DEVICE)])
+
+        with self.assertRaises(AttributeError):
+            snap.devices[0].vram_used = 0
+        with self.assertRaises(AttributeError):
+            snap.extra = 1
+
+    def test_snapshot_serializes(self):
+        snap = rocmi.snapshot([rocmi.DeviceInfo(DEVICE)])
+
+        d = json.loads(json.dumps(snap.to_dict()))
+        self.assertEqual(d["devices"][0]["metrics"]["temperature_hbm"], [0, 0, 70, 0])
+        self.assertEqual(d["processes"][0]["name"], "trainer")
+        self.assertEqual(d["processes"][0]["gpu_usage_info"], {"42700": {"vram": 4096}})
+
+        self.assertEqual(pickle.loads(pickle.dumps(snap)), snap)
+
+    def test_missing_metrics(self):
+        self.fs.remove("%s/gpu_metrics" % DEVICE)
+
+        snap = rocmi.snapshot([rocmi.DeviceInfo(DEVICE)])
+        self.assertIsNone(snap.devices[0].metrics())
+        self.assertIsNone(snap.devices[0].to_dict()["metrics"])
+
+    def test_missing_unique_id(self):
+        # consumer parts don't expose unique_id
+        self.fs.remove("%s/unique_id" % DEVICE)
+
+        snap = rocmi.snapshot([rocmi.DeviceInfo(DEVICE)])
+        self.assertIsNone(snap.devices[0].unique_id)
+        self.assertEqual(snap.devices[0].vram_used, 1024)
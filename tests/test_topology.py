@@ -0,0 +1,128 @@
+import itertools
+import random
+import time
+
+from pyfakefs.fake_filesystem_unittest import TestCase
+
+NODES = "/sys/class/kfd/kfd/topology/nodes"
+
+
+def create_node(fs, node_id, simd_count, gpu_id=0, unique_id=0):
+    props = "cpu_cores_count %d\nsimd_count %d\nhive_id %d\nunique_id %d\n" % (
+        0 if simd_count else 64,
+        simd_count,
+        1 if simd_count else 0,
+        unique_id,
+    )
+
+    fs.create_file("%s/%d/gpu_id" % (NODES, node_id), contents=str(gpu_id))
+    fs.create_file("%s/%d/properties" % (NODES, node_id), contents=props)
+
+
+def create_link(fs, kind, node_from, node_to, typ, weight):
+    parent = "%s/%d/%s" % (NODES, node_from, kind)
+    try:
+        idx = len(fs.listdir(parent))
+    except Exception:
+        idx = 0
+
+    props = "type %d\nnode_from %d\nnode_to %d\nweight %d\n" % (
+        typ,
+        node_from,
+        node_to,
+        weight,
+    )
+    fs.create_file("%s/%d/properties" % (parent, idx), contents=props)
+
+
+def setup_topology(fs):
+    # two sockets, GPUs 2,3 on the first and 4,5 on the second
+    create_node(fs, 0, 0)
+    create_node(fs, 1, 0)
+    for node, numa in ((2, 0), (3, 0), (4, 1), (5, 1)):
+        create_node(fs, node, 304, gpu_id=1000 + node, unique_id=0xAA00 + node)
+        create_link(fs, "io_links", node, numa, 2, 20)
+
+    xgmi = [(2, 3, 15), (2, 4, 15), (3, 4, 15), (4, 5, 10)]
+    for a, b, weight in xgmi:
+        create_link(fs, "io_links", a, b, 11, weight)
+        create_link(fs, "io_links", b, a, 11, weight)
+
+
+class TopologyTestCase(TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir(NODES)
+        setup_topology(self.fs)
+
+        global topology
+        from rocmi import topology
+
+        self.topo = topology.Topology.from_sysfs()
+
+    def test_nodes(self):
+        self.assertEqual(self.topo.cpus, (0, 1))
+        self.assertEqual(self.topo.gpus, (2, 3, 4, 5))
+        self.assertEqual(self.topo.node_for_gpu_id(1004), 4)
+        self.assertEqual(self.topo.node_for_unique_id("000000000000aa05"), 5)
+
+    def test_numa(self):
+        self.assertEqual(self.topo.gpus_on_numa(0), (2, 3))
+        self.assertEqual(self.topo.gpus_on_numa(1), (4, 5))
+        self.assertEqual(self.topo.gpus_on_numa(7), ())
+        self.assertEqual(self.topo.numa_node(5), 1)
+
+    def test_links_and_hops(self):
+        link = self.topo.link(4, 5)
+        self.assertEqual(link.type, 11)
+        self.assertEqual(link.weight, 10)
+        self.assertIsNone(self.topo.link(2, 5))
+        self.assertEqual(self.topo.hops(2, 3), 1)
+        self.assertEqual(self.topo.hops(2, 5), 2)
+        self.assertEqual(self.topo.xgmi_peers(4), frozenset([2, 3, 5]))
+
+    def test_best_xgmi_set(self):
+        self.assertEqual(self.topo.best_xgmi_set(2), (4, 5))
+        self.assertEqual(self.topo.best_xgmi_set(3), (2, 3, 4))
+        self.assertIsNone(self.topo.best_xgmi_set(4))
+        self.assertEqual(self.topo.best_xgmi_set(2, candidates=[2, 3, 5]), (2, 3))
+
+    def test_best_xgmi_set_large_hive(self):
+        # 24 fully connected GPUs, far too many combinations to enumerate
+        for node in range(10, 34):
+            create_node(self.fs, node, 304, gpu_id=1000 + node, unique_id=node)
+        for a, b in itertools.combinations(range(10, 34), 2):
+            create_link(self.fs, "io_links", a, b, 11, 15)
+            create_link(self.fs, "io_links", b, a, 11, 15)
+        topo = topology.Topology.from_sysfs()
+
+        start = time.perf_counter()
+        best = topo.best_xgmi_set(12, candidates=range(10, 34))
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(best, tuple(range(10, 22)))
+
+    def test_best_xgmi_set_matches_exhaustive(self):
+        rnd = random.Random(7)
+        nodes = range(10, 20)
+        weights = {}
+        for node in nodes:
+            create_node(self.fs, node, 304, gpu_id=1000 + node, unique_id=node)
+        for a, b in itertools.combinations(nodes, 2):
+            if rnd.random() < 0.8:
+                weights[(a, b)] = rnd.randint(10, 40)
+                create_link(self.fs, "io_links", a, b, 11, weights[(a, b)])
+                create_link(self.fs, "io_links", b, a, 11, weights[(a, b)])
+        topo = topology.Topology.from_sysfs()
+
+        for k in range(2, 8):
+            expected = None
+            best_weight = None
+            for combo in itertools.combinations(nodes, k):
+                pairs = list(itertools.combinations(combo, 2))
+                if not all(p in weights for p in pairs):
+                    continue
+                weight = sum(weights[p] for p in pairs)
+                if expected is None or weight < best_weight:
+                    expected, best_weight = combo, weight
+
+            self.assertEqual(topo.best_xgmi_set(k, candidates=nodes), expected)